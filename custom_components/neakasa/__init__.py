@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
 from collections.abc import Callable
 from dataclasses import dataclass
 from typing import Dict
@@ -28,68 +29,94 @@ class RuntimeData:
     cancel_update_listener: Callable
 
 
-# Global shared API instances and locks
-_shared_apis: Dict[str, NeakasaAPI] = {}
-_shared_locks: Dict[str, asyncio.Lock] = {}
+# Global shared API instances and locks, keyed by a digest of the credentials
+# so the password does not live on in the keys
+_shared_apis: Dict[bytes, NeakasaAPI] = {}
+_shared_locks: Dict[bytes, asyncio.Lock] = {}
+# Number of loaded config entries using each shared API instance
+_shared_api_refcount: Dict[bytes, int] = {}
+
+
+def _cred_key(username: str, password: str) -> bytes:
+    """Key for the shared API registry derived from the credentials."""
+    return hashlib.blake2b(f"{username}:{password}".encode(), digest_size=16).digest()
 
 
 async def get_shared_api(hass: HomeAssistant, username: str, password: str) -> NeakasaAPI:
     """Get or create a shared API instance for the given credentials."""
-    credentials_key = f"{username}:{password}"
-    
-    # Initialize lock for this credential set if it doesn't exist
-    if credentials_key not in _shared_locks:
-        _shared_locks[credentials_key] = asyncio.Lock()
-    
+    credentials_key = _cred_key(username, password)
+
+    # Fast path: a valid instance needs no lock
+    api = _shared_apis.get(credentials_key)
+    if api is not None and api.is_valid:
+        return api
+
     # Use lock to prevent concurrent authentication attempts
-    async with _shared_locks[credentials_key]:
+    async with _shared_locks.setdefault(credentials_key, asyncio.Lock()):
         # Check if we already have a valid API instance for these credentials
-        if credentials_key in _shared_apis:
-            api = _shared_apis[credentials_key]
+        api = _shared_apis.get(credentials_key)
+        if api is not None:
             # If the API is connected and has valid tokens, return it
-            if api.connected and hasattr(api, '_iotToken') and api._iotToken:
+            if api.is_valid:
                 _LOGGER.debug(f"Reusing existing shared API instance for {username}")
                 return api
             else:
                 # Clear invalid API instance
-                _LOGGER.debug(f"Clearing invalid API instance for {username} (connected: {api.connected}, has_token: {hasattr(api, '_iotToken') and api._iotToken})")
+                log_state = (api.connected, bool(getattr(api, '_iotToken', None)))
+                _LOGGER.debug(f"Clearing invalid API instance for {username} (connected: {log_state[0]}, has_token: {log_state[1]})")
                 del _shared_apis[credentials_key]
         
-        # Create new API instance
-        session = async_get_clientsession(hass)
-        api = NeakasaAPI(session, hass.async_add_executor_job)
-        
-        try:
-            # Authenticate the API
-            _LOGGER.debug(f"Authenticating new shared API instance for {username}")
-            await api.connect(username, password)
-            _shared_apis[credentials_key] = api
-            _LOGGER.debug(f"Successfully created and authenticated shared API instance for {username}")
-            return api
-        except Exception as e:
-            _LOGGER.error(f"Failed to authenticate shared API for {username}: {e}")
-            raise
+        return await _connect_shared_api(hass, credentials_key, username, password)
+
+
+async def _connect_shared_api(hass: HomeAssistant, credentials_key: bytes, username: str, password: str) -> NeakasaAPI:
+    """Authenticate a new API instance and store it. Caller must hold the credential lock."""
+    session = async_get_clientsession(hass)
+    api = NeakasaAPI(session, hass.async_add_executor_job)
+    
+    try:
+        # Authenticate the API
+        _LOGGER.debug(f"Authenticating new shared API instance for {username}")
+        await api.connect(username, password)
+        _shared_apis[credentials_key] = api
+        _LOGGER.debug(f"Successfully created and authenticated shared API instance for {username}")
+        return api
+    except Exception as e:
+        _LOGGER.error(f"Failed to authenticate shared API for {username}: {e}")
+        raise
+
+
+def _register_shared_api(hass: HomeAssistant, username: str, password: str, api: NeakasaAPI):
+    """Store an already authenticated API instance so entry setup can reuse it."""
+    credentials_key = _cred_key(username, password)
+    existing = _shared_apis.get(credentials_key)
+    if existing is None or not existing.is_valid:
+        _LOGGER.debug(f"Registering authenticated API instance for {username}")
+        _shared_apis[credentials_key] = api
 
 
 def clear_shared_api(username: str, password: str):
     """Clear the shared API instance for the given credentials."""
-    credentials_key = f"{username}:{password}"
-    if credentials_key in _shared_apis:
-        del _shared_apis[credentials_key]
-    if credentials_key in _shared_locks:
-        del _shared_locks[credentials_key]
+    credentials_key = _cred_key(username, password)
+    _shared_apis.pop(credentials_key, None)
+    _shared_locks.pop(credentials_key, None)
 
 
 async def force_reconnect_api(hass: HomeAssistant, username: str, password: str) -> NeakasaAPI:
     """Force reconnection of the API for the given credentials."""
-    credentials_key = f"{username}:{password}"
-    
-    # Clear existing instance
-    if credentials_key in _shared_apis:
-        del _shared_apis[credentials_key]
-    
-    # Get a fresh API instance
-    return await get_shared_api(hass, username, password)
+    credentials_key = _cred_key(username, password)
+    # the instance the caller failed with, before waiting for the lock
+    stale_api = _shared_apis.get(credentials_key)
+
+    # Invalidate and reconnect under the same lock so concurrent callers
+    # wait for this reconnect instead of starting their own
+    async with _shared_locks.setdefault(credentials_key, asyncio.Lock()):
+        api = _shared_apis.get(credentials_key)
+        if api is not None and api is not stale_api and api.is_valid:
+            _LOGGER.debug(f"API for {username} was already reconnected, reusing it")
+            return api
+        _shared_apis.pop(credentials_key, None)
+        return await _connect_shared_api(hass, credentials_key, username, password)
 
 
 async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> bool:
@@ -100,10 +127,15 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> b
     # Initialise the coordinator that manages data updates from your api.
     # This is defined in coordinator.py
     coordinator = NeakasaCoordinator(hass, config_entry)
+    await coordinator.async_attach_account()
 
     # Perform an initial data load from api.
     # async_config_entry_first_refresh() is special in that it does not log errors if it fails
-    await coordinator.async_config_entry_first_refresh()
+    try:
+        await coordinator.async_config_entry_first_refresh()
+    except Exception:
+        await _async_release_failed_setup(coordinator)
+        raise
 
     # Test to see if api initialised correctly, else raise ConfigNotReady to make HA retry setup
     # The API connection is now handled by the shared API manager
@@ -120,12 +152,30 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> b
 
     # Setup platforms (based on the list of entity types in PLATFORMS defined above)
     # This calls the async_setup method in each of your entity type files.
-    await hass.config_entries.async_forward_entry_setups(config_entry, PLATFORMS);
+    # HA does not call async_unload_entry if this fails, so clean up here.
+    try:
+        await hass.config_entries.async_forward_entry_setups(config_entry, PLATFORMS);
+    except Exception:
+        cancel_update_listener()
+        hass.data[DOMAIN].pop(config_entry.entry_id, None)
+        await _async_release_failed_setup(coordinator)
+        raise
+
+    # Only count the entry once it is fully set up and will be unloaded.
+    _shared_api_refcount[coordinator.credentials_key] = _shared_api_refcount.get(coordinator.credentials_key, 0) + 1
 
     # Return true to denote a successful setup.
     return True
 
 
+async def _async_release_failed_setup(coordinator: NeakasaCoordinator):
+    """Release what a failed setup acquired."""
+    await coordinator.async_release_account()
+    # don't keep an API authenticated during this setup if no loaded entry uses it
+    if _shared_api_refcount.get(coordinator.credentials_key, 0) == 0:
+        clear_shared_api(coordinator.username, coordinator.password)
+
+
 async def _async_update_listener(hass: HomeAssistant, config_entry):
     """Handle config options update."""
     # Reload the integration when the options change.
@@ -149,24 +199,20 @@ async def async_unload_entry(hass: HomeAssistant, config_entry: ConfigEntry) ->
     if unload_ok:
         # Get coordinator info before removing the entry
         coordinator = hass.data[DOMAIN][config_entry.entry_id].coordinator
-        username = coordinator.username
-        password = coordinator.password
+        await coordinator.async_release_account()
+        credentials_key = coordinator.credentials_key
         
         # Remove the entry from hass data
         hass.data[DOMAIN].pop(config_entry.entry_id)
         
-        # Check if any other devices are using the same credentials
-        other_devices_using_creds = False
-        for entry_id, runtime_data in hass.data[DOMAIN].items():
-            other_coordinator = runtime_data.coordinator
-            if (other_coordinator.username == username and 
-                other_coordinator.password == password):
-                other_devices_using_creds = True
-                break
-        
-        # Only clear the shared API if no other devices are using these credentials
-        if not other_devices_using_creds:
-            clear_shared_api(username, password)
+        # Only clear the shared API if no other devices are using these credentials.
+        # The API only uses Home Assistant's shared aiohttp session, so there is nothing to close.
+        refcount = _shared_api_refcount.get(credentials_key, 0) - 1
+        if refcount > 0:
+            _shared_api_refcount[credentials_key] = refcount
+        else:
+            _shared_api_refcount.pop(credentials_key, None)
+            clear_shared_api(coordinator.username, coordinator.password)
 
     # Return that unloading was successful.
     return unload_ok
@@ -30,6 +30,11 @@ class NeakasaAPI:
         self.async_executor = async_executor
         self.connected: bool = False
 
+    @property
+    def is_valid(self) -> bool:
+        """connected and holding an iot token"""
+        return self.connected and bool(getattr(self, '_iotToken', None))
+
     async def connect(self, username: str, password: str, firstRun: bool = True):
         if self.connected == False:
             await self._loadBaseUrlByAccount(username)
@@ -96,7 +101,7 @@ class NeakasaAPI:
                 if response_json['code'] != 0:
                     raise APIAuthError("Error connecting to api. Invalid username or password.")
                 self._ali_authentication_token = response_json['data']['user_info']['ali_authentication_token']
-                await self._encryption.decodeLoginToken(response_json['data']['login_token'])
+                self._encryption.decodeLoginToken(response_json['data']['login_token'])
         except ClientError as exc:
             raise APIConnectionError("Error connecting to api.")
 
@@ -421,7 +426,7 @@ class NeakasaAPI:
                 },
                 headers={
                 "Request-Id": signature,
-                "Token": str(await self._encryption.getToken()),
+                "Token": self._encryption.getToken(),
                 "Uid": self._encryption.uid,
                 "Accept-Language": "en"
             }) as response:
@@ -448,7 +453,7 @@ class NeakasaAPI:
                 },
                 headers={
                 "Request-Id": signature,
-                "Token": str(await self._encryption.getToken()),
+                "Token": self._encryption.getToken(),
                 "Uid": self._encryption.uid,
                 "Accept-Language": "en"
             }) as response:
@@ -14,50 +14,56 @@ class APIEncryption:
         self.aes_key = AES_KEY_DEFAULT   # must be 16/24/32 bytes
         self.aes_iv = AES_IV_DEFAULT     # must be 16 bytes
         self._token = ""                 # ensure defined
+        self._buildCipher()
 
-    async def _pad(self, data: bytes) -> bytes:
+    def _buildCipher(self):
+        # key/iv only change on reset or login, so build the cipher once per change
+        self._cipher = Cipher(algorithms.AES(self.aes_key), modes.CBC(self.aes_iv))
+
+    def _pad(self, data: bytes) -> bytes:
         """Manual zero padding to 16-byte blocks (matches your NoPadding approach)."""
-        block_size = 16
-        pad_len = (-len(data)) % block_size
-        return data if pad_len == 0 else data + (b"\x00" * pad_len)
+        return data.ljust((len(data) + 15) & ~15, b"\x00")
 
-    async def _unpad(self, data: bytes) -> bytes:
+    def _unpad(self, data: bytes) -> bytes:
         """Strip trailing nulls (⚠️ be aware this can lose intentional trailing zeros)."""
         return data.rstrip(b"\x00")
 
-    async def encrypt(self, plain_text: str) -> str:
-        cipher = Cipher(algorithms.AES(self.aes_key), modes.CBC(self.aes_iv))
-        encryptor = cipher.encryptor()
-        padded = await self._pad(plain_text.encode("utf-8"))
-        ct = encryptor.update(padded) + encryptor.finalize()
-        return b64encode(ct).decode("utf-8")
+    def _encrypt_sync(self, data: bytes) -> bytes:
+        encryptor = self._cipher.encryptor()
+        return encryptor.update(self._pad(data)) + encryptor.finalize()
+
+    def _decrypt_sync(self, data: bytes) -> bytes:
+        decryptor = self._cipher.decryptor()
+        return self._unpad(decryptor.update(data) + decryptor.finalize())
+
+    def _encrypt_text(self, plain_text: str) -> str:
+        return b64encode(self._encrypt_sync(plain_text.encode("utf-8"))).decode("utf-8")
 
-    async def decrypt(self, encrypted_text: str) -> str:
-        cipher = Cipher(algorithms.AES(self.aes_key), modes.CBC(self.aes_iv))
-        decryptor = cipher.decryptor()
-        raw = b64decode(encrypted_text.replace(" ", "+"))
-        pt_padded = decryptor.update(raw) + decryptor.finalize()
-        pt = await self._unpad(pt_padded)
-        return pt.decode("utf-8")
+    def _decrypt_text(self, encrypted_text: str) -> str:
+        # "+" may arrive url-decoded as " "
+        if " " in encrypted_text:
+            encrypted_text = encrypted_text.replace(" ", "+")
+        return self._decrypt_sync(b64decode(encrypted_text)).decode("utf-8")
 
-    async def _get_timestamp(self) -> str:
-        return format(time.time(), ".6f")  # seconds with 6 decimal places
+    def _get_timestamp(self) -> str:
+        return f"{time.time():.6f}"  # seconds with 6 decimal places
 
-    async def getToken(self) -> str:
-        return await self.encrypt(self._token + "@" + await self._get_timestamp())
+    def getToken(self) -> str:
+        return self._encrypt_text(self._token + "@" + self._get_timestamp())
 
-    async def decodeLoginToken(self, login_token: str):
+    def decodeLoginToken(self, login_token: str):
         self.resetEncryption()
 
-        decrypted = await self.decrypt(login_token)
+        decrypted = self._decrypt_text(login_token)
         parts = decrypted.split("@")
 
         if len(parts) >= 1:
             self._token = parts[0]
         if len(parts) >= 2:
             self.userid = parts[1]
-            self.uid = await self.encrypt(parts[1])
+            self.uid = self._encrypt_text(parts[1])
         if len(parts) >= 3:
             self.aes_key = parts[2].encode()  # ensure 16/24/32 bytes
         if len(parts) >= 4:
             self.aes_iv = parts[3].encode()   # ensure 16 bytes
+        self._buildCipher()
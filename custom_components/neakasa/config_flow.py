@@ -21,6 +21,7 @@ class NeakasaConfigFlow(ConfigFlow, domain=DOMAIN):
         self._username: str | None = None
         self._password: str | None = None
         self._discovered_devices: dict[str, str] = {}
+        self._api: NeakasaAPI | None = None
         _LOGGER.debug("Initializing NeakasaConfigFlow")
 
     async def async_step_user(self, user_input: dict[str, Any] | None = None):
@@ -49,6 +50,7 @@ class NeakasaConfigFlow(ConfigFlow, domain=DOMAIN):
             session = async_get_clientsession(self.hass)
             api = NeakasaAPI(session, self.hass.async_add_executor_job)
             await api.connect(self._username, self._password)
+            self._api = api
 
             devices = await api.getDevices()
             discovered_devices: dict[str, str] = {}
@@ -94,4 +96,8 @@ class NeakasaConfigFlow(ConfigFlow, domain=DOMAIN):
             CONF_PASSWORD: self._password,
         }
         title = self._discovered_devices[device_id]
+        # let the config entry setup reuse this session instead of logging in again
+        if self._api is not None:
+            from . import _register_shared_api
+            _register_shared_api(self.hass, self._username, self._password, self._api)
         return self.async_create_entry(title=title, data=data)
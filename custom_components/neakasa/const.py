@@ -1,6 +1,7 @@
 import logging
 
 DOMAIN = "neakasa"
+DATA_ACCOUNTS = "_accounts"
 AES_KEY_DEFAULT = b"3J74PRUE5TKPJP32"
 AES_IV_DEFAULT = b"QB8GC2X6WK39FF93"
 
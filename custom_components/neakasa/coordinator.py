@@ -1,25 +1,30 @@
-from dataclasses import dataclass, field
+import asyncio
+from dataclasses import dataclass, field, replace
 from datetime import timedelta
 import logging
 from typing import Optional, Any, Awaitable, Callable
 
-from homeassistant.config_entries import ConfigEntry
+from homeassistant.config_entries import ConfigEntry, current_entry
 from homeassistant.const import (
     CONF_DEVICE_ID,
     CONF_FRIENDLY_NAME,
     CONF_USERNAME,
     CONF_PASSWORD,
 )
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.event import async_call_later
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 from datetime import datetime
 
 from .api import NeakasaAPI, APIAuthError, APIConnectionError
 from .value_cacher import ValueCacher
-from .const import DOMAIN, _LOGGER
+from .const import DOMAIN, DATA_ACCOUNTS, _LOGGER
 
-@dataclass
+# time to wait after invoking a service before fetching the real status
+SERVICE_REFRESH_DELAY = timedelta(seconds=10)
+
+@dataclass(slots=True, frozen=True)
 class NeakasaAPIData:
     """Class to hold api data."""
 
@@ -42,6 +47,114 @@ class NeakasaAPIData:
     cat_list: list[object] = field(default_factory=list)
     record_list: list[object] = field(default_factory=list)
 
+class NeakasaAccountCoordinator(DataUpdateCoordinator):
+    """Polls all devices of one account in a single batch."""
+
+    data: dict[str, Any]
+
+    def __init__(self, hass: HomeAssistant, username: str, password: str) -> None:
+        """Initialize account coordinator."""
+
+        self.username = username
+        self.password = password
+        self._devices_by_id = None
+        # bumped on every device list load, so waiters can tell the list was just refetched
+        self._devices_generation = 0
+        self._devices_lock = asyncio.Lock()
+        self._device_ids: set[str] = set()
+
+        # Shared by all entries of the account, so it must not be tied to (and shut down
+        # with) the entry that happens to be set up first. async_release_account stops it.
+        token = current_entry.set(None)
+        try:
+            super().__init__(
+                hass,
+                _LOGGER,
+                name=f"{DOMAIN} account ({username})",
+                update_method=self.async_update_data,
+                # Polling interval. Will only be polled if there are subscribers.
+                update_interval=timedelta(seconds=60),
+            )
+        finally:
+            current_entry.reset(token)
+
+    @property
+    def is_shut_down(self) -> bool:
+        return self._shutdown_requested
+
+    def register_device(self, deviceid: str):
+        self._device_ids.add(deviceid)
+
+    def unregister_device(self, deviceid: str) -> bool:
+        """Forget a device, returns True if the account has no devices left."""
+        self._device_ids.discard(deviceid)
+        return len(self._device_ids) == 0
+
+    async def _loadDevices(self):
+        from . import get_shared_api
+        api = await get_shared_api(self.hass, self.username, self.password)
+        devices = await api.getDevices()
+        self._devices_by_id = {device['iotId']: device for device in devices}
+        self._devices_generation += 1
+
+    async def async_get_device(self, deviceid: str):
+        """get a device of the account by iotId, the device list is refetched only on a miss"""
+        generation = self._devices_generation
+        async with self._devices_lock:
+            if self._devices_by_id is None:
+                await self._loadDevices()
+            device = self._devices_by_id.get(deviceid)
+            # device may have been paired after the list was cached,
+            # unless the list was loaded while we waited for the lock
+            if device is None and generation == self._devices_generation:
+                await self._loadDevices()
+                device = self._devices_by_id.get(deviceid)
+        return device
+
+    async def async_get_device_properties(self, deviceid: str):
+        """get the properties of a device from the last batch, fetching only this device if it is not in there yet"""
+        if self.data is None or deviceid not in self.data:
+            from . import get_shared_api
+            api = await get_shared_api(self.hass, self.username, self.password)
+            return await api.getDeviceProperties(deviceid)
+        result = self.data[deviceid]
+        # the stored error is shared by all readers, raise a new one for this caller
+        if isinstance(result, (APIAuthError, APIConnectionError)):
+            raise type(result)(*result.args) from result
+        if isinstance(result, Exception):
+            raise APIConnectionError(f"Error getting device properties: {result}") from result
+        return result
+
+    async def async_update_data(self):
+        """Fetch the properties of all registered devices.
+
+        Errors are stored per device so each device coordinator can handle them on its own.
+        """
+        device_ids = list(self._device_ids)
+        try:
+            from . import get_shared_api
+            api = await get_shared_api(self.hass, self.username, self.password)
+        except (APIAuthError, APIConnectionError) as err:
+            return {deviceid: err for deviceid in device_ids}
+
+        results = await asyncio.gather(
+            *(api.getDeviceProperties(deviceid) for deviceid in device_ids),
+            return_exceptions=True
+        )
+        return dict(zip(device_ids, results))
+
+
+async def async_get_account_coordinator(hass: HomeAssistant, credentials_key: bytes, username: str, password: str) -> NeakasaAccountCoordinator:
+    """Get or create the account coordinator for the given credentials."""
+    accounts = hass.data.setdefault(DOMAIN, {}).setdefault(DATA_ACCOUNTS, {})
+    account = accounts.get(credentials_key)
+    if account is None or account.is_shut_down:
+        account = accounts[credentials_key] = NeakasaAccountCoordinator(hass, username, password)
+        # not linked to a config entry, so stop it together with Home Assistant
+        await account.async_register_shutdown()
+    return account
+
+
 class NeakasaCoordinator(DataUpdateCoordinator):
     """My coordinator."""
 
@@ -55,9 +168,12 @@ class NeakasaCoordinator(DataUpdateCoordinator):
         self.devicename = config_entry.data[CONF_FRIENDLY_NAME]
         self.username = config_entry.data[CONF_USERNAME]
         self.password = config_entry.data[CONF_PASSWORD]
+        from . import _cred_key
+        self.credentials_key = _cred_key(self.username, self.password)
 
         self._deviceName = None
         self.lastUseDate = None
+        self._cancel_service_refresh = None
 
         self._recordsCache = ValueCacher(refresh_after=timedelta(minutes=30), discard_after=timedelta(hours=4))
         self._devicePropertiesCache = ValueCacher(refresh_after=timedelta(seconds=0), discard_after=timedelta(minutes=30))
@@ -69,46 +185,84 @@ class NeakasaCoordinator(DataUpdateCoordinator):
             name=f"{DOMAIN} ({config_entry.unique_id})",
             # Method to call on every update interval.
             update_method=self.async_update_data,
-            # Polling interval. Will only be polled if there are subscribers.
-            update_interval=timedelta(seconds=60),
+            # No own polling, updates are pushed by the account coordinator.
+            update_interval=None,
+            # Only notify entities when the data actually changed (NeakasaAPIData.__eq__).
+            # async_set_updated_data in setProperty and invokeService still notifies them unconditionally.
+            always_update=False,
         )
 
         # API will be obtained from the shared manager when needed
         self.api = None
-        
+
+        self._account: NeakasaAccountCoordinator | None = None
+        self._unsub_account = None
+
+    async def async_attach_account(self):
+        """Subscribe to the account coordinator that polls this device."""
+        self._account = await async_get_account_coordinator(self.hass, self.credentials_key, self.username, self.password)
+        self._account.register_device(self.deviceid)
+        self._unsub_account = self._account.async_add_listener(self._handle_account_update)
+
+    @callback
+    def _handle_account_update(self) -> None:
+        self.hass.async_create_task(self.async_request_refresh())
+
+    async def async_release_account(self):
+        """Stop listening to the account coordinator, dropping it if no device uses it anymore."""
+        if self._unsub_account is not None:
+            self._unsub_account()
+            self._unsub_account = None
+        if self._cancel_service_refresh is not None:
+            self._cancel_service_refresh()
+            self._cancel_service_refresh = None
+        if self._account is not None and self._account.unregister_device(self.deviceid):
+            accounts = self.hass.data[DOMAIN].get(DATA_ACCOUNTS, {})
+            if accounts.get(self.credentials_key) is self._account:
+                accounts.pop(self.credentials_key)
+            await self._account.async_shutdown()
 
     async def setProperty(self, key: str, value: Any):
         from . import get_shared_api
         api = await get_shared_api(self.hass, self.username, self.password)
         await api.setDeviceProperties(self.deviceid, {key: value})
         #update data
-        setattr(self.data, key, value)
-        self.async_set_updated_data(self.data)
+        self.async_set_updated_data(replace(self.data, **{key: value}))
 
     async def invokeService(self, service: str):
         from . import get_shared_api
         api = await get_shared_api(self.hass, self.username, self.password)
         match service:
             case 'clean':
-                return await api.cleanNow(self.deviceid)
+                await api.cleanNow(self.deviceid)
+                bucketStatus = 2
             case 'level':
-                return await api.sandLeveling(self.deviceid)
-        raise Exception('cannot find service to invoke')
+                await api.sandLeveling(self.deviceid)
+                bucketStatus = 3
+            case _:
+                raise Exception('cannot find service to invoke')
+        #show the expected status right away, the real one is fetched shortly after
+        self.async_set_updated_data(replace(self.data, bucketStatus=bucketStatus))
+        if self._cancel_service_refresh is not None:
+            self._cancel_service_refresh()
+        self._cancel_service_refresh = async_call_later(self.hass, SERVICE_REFRESH_DELAY, self._refreshAccount)
+
+    @callback
+    def _refreshAccount(self, _now) -> None:
+        self._cancel_service_refresh = None
+        # the device coordinator reads from the account batch, so that one needs to be refetched
+        self.hass.async_create_task(self._account.async_request_refresh())
 
     async def _getDeviceName(self):
         if self._deviceName is not None:
             return self._deviceName
 
         """get deviceName by iotId"""
-        from . import get_shared_api
-        api = await get_shared_api(self.hass, self.username, self.password)
-        devices = await api.getDevices()
-        devices = list(filter(lambda devices: devices['iotId'] == self.deviceid, devices))
-        if(len(devices) == 0):
+        device = await self._account.async_get_device(self.deviceid)
+        if device is None:
             raise APIConnectionError("iotId not found in device list")
-        deviceName = devices[0]['deviceName']
-        self._deviceName = deviceName
-        return deviceName
+        self._deviceName = device['deviceName']
+        return self._deviceName
 
     async def _getRecords(self):
         async def fetch():
@@ -121,12 +275,45 @@ class NeakasaCoordinator(DataUpdateCoordinator):
 
     async def _getDeviceProperties(self):
         async def fetch():
-            from . import get_shared_api
-            api = await get_shared_api(self.hass, self.username, self.password)
-            return await api.getDeviceProperties(self.deviceid)
+            return await self._account.async_get_device_properties(self.deviceid)
 
         return await self._devicePropertiesCache.get_or_update(fetch)
 
+    def _build_api_data(self, devicedata, records) -> NeakasaAPIData:
+        sand = devicedata['Sand']['value']
+        catLeft = devicedata['catLeft']
+        return NeakasaAPIData(
+            binFullWaitReset=devicedata['binFullWaitReset']['value'] == 1, #-> Abfalleimer voll
+           # cleanCfg=devicedata['cleanCfg']['value'],
+           # youngCatMode=devicedata['youngCatMode']['value'] == 1, #-> Kätzchen Modus
+           # childLockOnOff=devicedata['childLockOnOff']['value'] == 1, #-> Kindersicherung
+           # autoBury=devicedata['autoBury']['value'] == 1, #-> automatische Abdeckung
+           # autoLevel=devicedata['autoLevel']['value'] == 1, #-> automatische Nivellierung
+           # silentMode=devicedata['silentMode']['value'] == 1, #-> Stiller Modus
+           # autoForceInit=devicedata['autoForceInit']['value'] == 1, #-> automatische Wiederherstellung
+           # bIntrptRangeDet=devicedata['bIntrptRangeDet']['value'] == 1, #-> Unaufhaltsamer Kreislauf
+            sandLevelPercent=sand['percent'], #-> Katzenstreu Prozent
+           # wifiRssi=devicedata['NetWorkStatus']['value']['WiFi_RSSI'], #-> WLAN RSSI
+            bucketStatus=devicedata['bucketStatus']['value'], #-> Aktueller Status [0=Leerlauf,2=Reinigung,3=Nivellierung]
+            room_of_bin=devicedata['room_of_bin']['value'], #-> Abfalleimer [2=nicht in Position,0=Normal]
+            sandLevelState=sand['level'], #-> Katzenstreu [0=Unzureichend,1=Mäßig,2=Ausreichend]
+            stayTime=catLeft['value'].get('stayTime', 0),
+            lastUse=catLeft['time'],
+
+            cat_list=records['cat_list'],
+            record_list=records['record_list']
+        )
+
+    async def _fetchAfterReconnect(self, api: NeakasaAPI) -> NeakasaAPIData:
+        """Retry the data fetch with a freshly connected api."""
+        devicedata = await api.getDeviceProperties(self.deviceid)
+        newLastUseDate = devicedata['catLeft']['time']
+        if self.lastUseDate != newLastUseDate:
+            self._recordsCache.mark_as_stale()
+        self.lastUseDate = newLastUseDate
+        records = await self._getRecords()
+        return self._build_api_data(devicedata, records)
+
     async def async_update_data(self):
         """Fetch data from API endpoint.
 
@@ -134,39 +321,23 @@ class NeakasaCoordinator(DataUpdateCoordinator):
         so entities can quickly look up their data.
         """
         try:
-            devicedata = await self._getDeviceProperties()
+            # fetch records alongside the properties, assuming the last use did not change
+            devicedata, records = await asyncio.gather(
+                self._getDeviceProperties(),
+                self._getRecords()
+            )
             
             newLastUseDate = devicedata['catLeft']['time']
 
-            if self.lastUseDate != newLastUseDate:
+            # the cat used the box since the last update, refetch the records
+            if self.lastUseDate is not None and self.lastUseDate != newLastUseDate:
                 self._recordsCache.mark_as_stale()
+                records = await self._getRecords()
 
             self.lastUseDate = newLastUseDate
-            
-            records = await self._getRecords()
 
             try:
-                return NeakasaAPIData(
-                    binFullWaitReset=devicedata['binFullWaitReset']['value'] == 1, #-> Abfalleimer voll
-                   # cleanCfg=devicedata['cleanCfg']['value'],
-                   # youngCatMode=devicedata['youngCatMode']['value'] == 1, #-> Kätzchen Modus
-                   # childLockOnOff=devicedata['childLockOnOff']['value'] == 1, #-> Kindersicherung
-                   # autoBury=devicedata['autoBury']['value'] == 1, #-> automatische Abdeckung
-                   # autoLevel=devicedata['autoLevel']['value'] == 1, #-> automatische Nivellierung
-                   # silentMode=devicedata['silentMode']['value'] == 1, #-> Stiller Modus
-                   # autoForceInit=devicedata['autoForceInit']['value'] == 1, #-> automatische Wiederherstellung
-                   # bIntrptRangeDet=devicedata['bIntrptRangeDet']['value'] == 1, #-> Unaufhaltsamer Kreislauf
-                    sandLevelPercent=devicedata['Sand']['value']['percent'], #-> Katzenstreu Prozent
-                   # wifiRssi=devicedata['NetWorkStatus']['value']['WiFi_RSSI'], #-> WLAN RSSI
-                    bucketStatus=devicedata['bucketStatus']['value'], #-> Aktueller Status [0=Leerlauf,2=Reinigung,3=Nivellierung]
-                    room_of_bin=devicedata['room_of_bin']['value'], #-> Abfalleimer [2=nicht in Position,0=Normal]
-                    sandLevelState=devicedata['Sand']['value']['level'], #-> Katzenstreu [0=Unzureichend,1=Mäßig,2=Ausreichend]
-                    stayTime=devicedata['catLeft']['value'].get('stayTime', 0),
-                    lastUse=newLastUseDate,
-
-                    cat_list=records['cat_list'],
-                    record_list=records['record_list']
-                )
+                return self._build_api_data(devicedata, records)
             except Exception as err:
                 _LOGGER.error(err)
                 # This will show entities as unavailable by raising UpdateFailed exception
@@ -178,35 +349,7 @@ class NeakasaCoordinator(DataUpdateCoordinator):
                 from . import force_reconnect_api
                 api = await force_reconnect_api(self.hass, self.username, self.password)
                 _LOGGER.info(f"Successfully reconnected API for device {self.devicename}")
-                # Retry the data fetch after reconnection
-                devicedata = await api.getDeviceProperties(self.deviceid)
-                # Continue with the rest of the data processing...
-                newLastUseDate = devicedata['catLeft']['time']
-                if self.lastUseDate != newLastUseDate:
-                    self._recordsCache.mark_as_stale()
-                self.lastUseDate = newLastUseDate
-                records = await self._getRecords()
-                
-                return NeakasaAPIData(
-                    binFullWaitReset=devicedata['binFullWaitReset']['value'] == 1,
-                    cleanCfg=devicedata['cleanCfg']['value'],
-                    youngCatMode=devicedata['youngCatMode']['value'] == 1,
-                    childLockOnOff=devicedata['childLockOnOff']['value'] == 1,
-                    autoBury=devicedata['autoBury']['value'] == 1,
-                    autoLevel=devicedata['autoLevel']['value'] == 1,
-                    silentMode=devicedata['silentMode']['value'] == 1,
-                    autoForceInit=devicedata['autoForceInit']['value'] == 1,
-                    bIntrptRangeDet=devicedata['bIntrptRangeDet']['value'] == 1,
-                    sandLevelPercent=devicedata['Sand']['value']['percent'],
-                    wifiRssi=devicedata['NetWorkStatus']['value']['WiFi_RSSI'],
-                    bucketStatus=devicedata['bucketStatus']['value'],
-                    room_of_bin=devicedata['room_of_bin']['value'],
-                    sandLevelState=devicedata['Sand']['value']['level'],
-                    stayTime=devicedata['catLeft']['value'].get('stayTime', 0),
-                    lastUse=newLastUseDate,
-                    cat_list=records['cat_list'],
-                    record_list=records['record_list']
-                )
+                return await self._fetchAfterReconnect(api)
             except Exception as reconnect_err:
                 _LOGGER.error(f"Failed to reconnect API for device {self.devicename}: {reconnect_err}")
                 raise UpdateFailed(f"Authentication failed and reconnection failed: {err}") from err
@@ -215,40 +358,11 @@ class NeakasaCoordinator(DataUpdateCoordinator):
             if "identityId is blank" in str(err):
                 _LOGGER.debug(f"IdentityId error for device {self.devicename}, attempting automatic reconnection")
                 try:
-                    # Clear the shared API to force a fresh connection
-                    from . import clear_shared_api, force_reconnect_api
-                    clear_shared_api(self.username, self.password)
+                    # Force a fresh connection, shared with other devices failing at the same time
+                    from . import force_reconnect_api
                     api = await force_reconnect_api(self.hass, self.username, self.password)
                     _LOGGER.debug(f"Successfully reconnected API for device {self.devicename}")
-                    # Retry the data fetch after reconnection
-                    devicedata = await api.getDeviceProperties(self.deviceid)
-                    # Continue with the rest of the data processing...
-                    newLastUseDate = devicedata['catLeft']['time']
-                    if self.lastUseDate != newLastUseDate:
-                        self._recordsCache.mark_as_stale()
-                    self.lastUseDate = newLastUseDate
-                    records = await self._getRecords()
-                    
-                    return NeakasaAPIData(
-                        binFullWaitReset=devicedata['binFullWaitReset']['value'] == 1,
-                        cleanCfg=devicedata['cleanCfg']['value'],
-                        youngCatMode=devicedata['youngCatMode']['value'] == 1,
-                        childLockOnOff=devicedata['childLockOnOff']['value'] == 1,
-                        autoBury=devicedata['autoBury']['value'] == 1,
-                        autoLevel=devicedata['autoLevel']['value'] == 1,
-                        silentMode=devicedata['silentMode']['value'] == 1,
-                        autoForceInit=devicedata['autoForceInit']['value'] == 1,
-                        bIntrptRangeDet=devicedata['bIntrptRangeDet']['value'] == 1,
-                        sandLevelPercent=devicedata['Sand']['value']['percent'],
-                        wifiRssi=devicedata['NetWorkStatus']['value']['WiFi_RSSI'],
-                        bucketStatus=devicedata['bucketStatus']['value'],
-                        room_of_bin=devicedata['room_of_bin']['value'],
-                        sandLevelState=devicedata['Sand']['value']['level'],
-                        stayTime=devicedata['catLeft']['value'].get('stayTime', 0),
-                        lastUse=newLastUseDate,
-                        cat_list=records['cat_list'],
-                        record_list=records['record_list']
-                    )
+                    return await self._fetchAfterReconnect(api)
                 except Exception as reconnect_err:
                     _LOGGER.error(f"Failed to reconnect API after identityId error for device {self.devicename}: {reconnect_err}")
                     raise UpdateFailed(f"IdentityId error and reconnection failed: {err}") from err
@@ -1,53 +1,57 @@
+import asyncio
 from dataclasses import dataclass, field
-from datetime import timedelta, datetime, timezone
+from datetime import timedelta
 import logging
+import time
 from typing import Optional, Any, Awaitable, Callable
 
 _LOGGER = logging.getLogger(__name__)
 
+def _to_ns(delta: Optional[timedelta]) -> Optional[int]:
+    """None never expires, a non-positive delta (-1) always does"""
+    if delta is None:
+        return None
+    if delta <= timedelta(0):
+        return -1
+    return int(delta.total_seconds() * 1e9)
+
 class ValueCacher:
     def __init__(self, refresh_after: Optional[timedelta], discard_after: Optional[timedelta]):
-        self._refresh_after = refresh_after
-        self._discard_after = discard_after
+        self._refresh_after_ns = _to_ns(refresh_after)
+        self._discard_after_ns = _to_ns(discard_after)
         self._manually_marked_stale = False
         self._value: Optional[Any] = None
-        self._last_update: Optional[datetime] = None
+        self._last_update_ns: Optional[int] = None
         # concurrency
-        import asyncio
         self._lock = asyncio.Lock()
         self._inflight = None  # asyncio.Task | None
 
     def set(self, value: Any) -> None:
         self._value = value
-        self._last_update = datetime.now(timezone.utc)
+        self._last_update_ns = time.monotonic_ns()
         self._manually_marked_stale = False
 
     def clear(self) -> None:
         self._value = None
-        self._last_update = None
+        self._last_update_ns = None
         self._manually_marked_stale = False
 
     def mark_as_stale(self) -> None:
         self._manually_marked_stale = True
 
     def value_if_not_stale(self) -> Optional[Any]:
-        if self._manually_marked_stale or self._value is None or self._last_update is None:
+        # _last_update_ns is always set together with _value
+        if self._manually_marked_stale or self._value is None:
+            return None
+        if self._refresh_after_ns is not None and time.monotonic_ns() - self._last_update_ns > self._refresh_after_ns:
             return None
-        if self._refresh_after is not None:
-            if self._refresh_after <= timedelta(0):
-                return None
-            if datetime.now(timezone.utc) - self._last_update > self._refresh_after:
-                return None
         return self._value
 
     def value_if_not_discarded(self) -> Optional[Any]:
-        if self._value is None or self._last_update is None:
+        if self._value is None:
+            return None
+        if self._discard_after_ns is not None and time.monotonic_ns() - self._last_update_ns > self._discard_after_ns:
             return None
-        if self._discard_after is not None:
-            if self._discard_after <= timedelta(0):
-                return None
-            if datetime.now(timezone.utc) - self._last_update > self._discard_after:
-                return None
         return self._value
 
     async def get_or_update(self, update_func: Callable[[], Awaitable[Any]]) -> Any:
@@ -71,8 +75,7 @@ class ValueCacher:
                         return fallback
                     raise
 
-            loop = __import__("asyncio").get_running_loop()
-            self._inflight = loop.create_task(update_func())
+            self._inflight = asyncio.create_task(update_func())
             try:
                 result = await self._inflight
                 self.set(result)